@@ -1,16 +1,19 @@
 import json
 import logging
+import mmap
 import os
 import struct
 import tempfile
 from argparse import Action, ArgumentParser
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from multiprocessing import cpu_count
 from multiprocessing.pool import ThreadPool
 from pathlib import Path
 from random import shuffle
-from threading import RLock, local
-from typing import Union
+from threading import local
+from typing import List, Tuple
 
 from mimesis import Address, Business, Datetime, Person
 from rich.logging import RichHandler
@@ -23,6 +26,18 @@ from rich.text import Text
 import lsm
 
 
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        # Same compact output as orjson produces
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"),
+        ).encode()
+
+
 class SpeedColumn(ProgressColumn):
     """Renders human readable transfer speed."""
 
@@ -72,6 +87,11 @@ class AppendConstAction(Action):
 parser = ArgumentParser()
 parser.add_argument("-n", "--count", default=100000, type=int)
 parser.add_argument("--pool-size", type=int, default=cpu_count())
+parser.add_argument(
+    "--gen-processes",
+    help="Processes generating the data file",
+    type=int, default=cpu_count(),
+)
 parser.add_argument(
     "--clear",
     help="Keep existent database before writing",
@@ -83,6 +103,11 @@ parser.add_argument(
 )
 
 parser.add_argument("--run-sequentially", action="store_true")
+parser.add_argument(
+    "--threaded-insert",
+    help="Fill the database from the thread pool instead of one thread",
+    action="store_true",
+)
 
 group = parser.add_argument_group("cases")
 group.add_argument(
@@ -136,6 +161,13 @@ group.add_argument(
     action=AppendConstAction,
 )
 
+group.add_argument(
+    "--bench-scan-seq",
+    dest="benchmarks",
+    const="scan-seq",
+    action=AppendConstAction,
+)
+
 group.add_argument(
     "--bench-copy-seq",
     dest="benchmarks",
@@ -144,25 +176,35 @@ group.add_argument(
 )
 
 
-person_generator = Person("en")
-address_generator = Address("en")
-business_generator = Business("en")
-datetime_generator = Datetime("en")
+# Amount of pre-generated values for each field of the generated records
+POOL_SIZE = 10000
 
 
 class Cases:
+    """
+    Compressed cases use bigger pages (``page_size`` in bytes) and blocks
+    (``block_size`` in kilobytes), because the compressors get more
+    redundancy per page. The raw case keeps the LSM defaults.
+    """
+
     @classmethod
     def lz4(cls, path):
         return [
             path + ".lsm.lz4",
-            dict(multiple_processes=False, compress="lz4"),
+            dict(
+                multiple_processes=False, compress="lz4",
+                page_size=8192, block_size=8192,
+            ),
         ]
 
     @classmethod
     def zstd(cls, path):
         return [
             path + ".lsm.zst",
-            dict(multiple_processes=False, compress="zstd"),
+            dict(
+                multiple_processes=False, compress="zstd",
+                page_size=8192, block_size=8192,
+            ),
         ]
 
     @classmethod
@@ -173,56 +215,119 @@ class Cases:
         ]
 
 
-def get_key(idx) -> Union[bytes, str]:
-    return struct.pack("I", idx)
+KEY_STRUCT = struct.Struct("I")
 
+# Filled by prepare_keys() once the amount of keys is known
+KEYS: List[bytes] = []
+get_key = KEYS.__getitem__
+
+
+def prepare_keys(n):
+    KEYS[:] = map(KEY_STRUCT.pack, range(n))
+
+
+def make_pool(factory) -> List[bytes]:
+    # Values are stored JSON encoded, ready to be put into RECORD_TEMPLATE
+    return [json_dumps(factory()) for _ in range(POOL_SIZE)]
+
+
+EMAIL_DOMAINS = ["gmail.com", "hotmail.com", "yandex.ru", "mail.ru"]
+
+RECORD_TEMPLATE = (
+    b'{"id":%d,'
+    b'"person":{'
+    b'"full_name":%b,"email":%b,"phone":%b,"avatar":%b,"language":%b'
+    b'},'
+    b'"gps":{"lat":%b,"lon":%b},'
+    b'"address":{'
+    b'"city":%b,"country":%b,"address":%b,"zip":%b,"region":%b'
+    b'},'
+    b'"business":{'
+    b'"company":%b,"type":%b,"copyright":%b,"currency":%b'
+    b'},'
+    b'"registration":{"join_date":%b}}'
+)
+
+# Pools in order of the RECORD_TEMPLATE placeholders
+RECORD_FIELDS = (
+    "full_name", "email", "phone", "avatar", "language",
+    "lat", "lon",
+    "city", "country", "address", "zip", "region",
+    "company", "company_type", "copyright", "currency",
+    "join_date",
+)
 
-def get_value(idx) -> Union[bytes, str]:
-    return json.dumps({
-        "id": idx,
-        "person": {
-            "full_name": person_generator.full_name(),
-            "email": person_generator.email(
-                domains=[
-                    "gmail.com",
-                    "hotmail.com",
-                    "yandex.ru",
-                    "mail.ru",
-                ],
-            ),
-            "phone": person_generator.telephone(mask="+7(9##)-###-####"),
-            "avatar": person_generator.avatar(),
-            "language": person_generator.language(),
-        },
-        "gps": {
-            "lat": address_generator.latitude(),
-            "lon": address_generator.longitude(),
-        },
-        "address": {
-            "city": address_generator.city(),
-            "country": address_generator.country_code(),
-            "address": address_generator.address(),
-            "zip": address_generator.zip_code(),
-            "region": address_generator.region(),
-        },
-        "business": {
-            "company": business_generator.company(),
-            "type": business_generator.company_type(),
-            "copyright": business_generator.copyright(),
-            "currency": business_generator.currency_symbol(),
-        },
-        "registration": {
-            "join_date": datetime_generator.datetime().isoformat(),
-        },
-    }).encode()
+
+def build_pools() -> Tuple[List[bytes], ...]:
+    person = Person("en")
+    address = Address("en")
+    business = Business("en")
+    datetime = Datetime("en")
+
+    pools = {
+        "full_name": make_pool(person.full_name),
+        "email": make_pool(lambda: person.email(domains=EMAIL_DOMAINS)),
+        "phone": make_pool(
+            lambda: person.telephone(mask="+7(9##)-###-####"),
+        ),
+        "avatar": make_pool(person.avatar),
+        "language": make_pool(person.language),
+        "lat": make_pool(address.latitude),
+        "lon": make_pool(address.longitude),
+        "city": make_pool(address.city),
+        "country": make_pool(address.country_code),
+        "address": make_pool(address.address),
+        "zip": make_pool(address.zip_code),
+        "region": make_pool(address.region),
+        "company": make_pool(business.company),
+        "company_type": make_pool(business.company_type),
+        "copyright": make_pool(business.copyright),
+        "currency": make_pool(business.currency_symbol),
+        "join_date": make_pool(lambda: datetime.datetime().isoformat()),
+    }
+
+    return tuple(pools[name] for name in RECORD_FIELDS)
+
+
+# Pools sampled by the data generating workers, see set_pools()
+POOLS: Tuple[List[bytes], ...] = ()
+
+
+def set_pools(pools: Tuple[List[bytes], ...]) -> None:
+    global POOLS
+    POOLS = pools
+
+
+def get_value(idx) -> bytes:
+    # Every pool is sampled independently, so a row of the pools
+    # is a random record and only the mimesis calls are amortized.
+    n = idx % POOL_SIZE
+    return RECORD_TEMPLATE % (idx, *[pool[n] for pool in POOLS])
 
 
 DATA_HEADER = struct.Struct("!I")
+EMPTY_HEADER = bytes(DATA_HEADER.size)
 
+# Inserts per transaction while writing to the database
+INSERT_BATCH_SIZE = 8192
 
-def gen_data(path, n, task_id: TaskID):
-    with open(path, "a+b") as fp:
-        fp.seek(0)
+# Records generated by a worker process and written to the file at once
+GEN_CHUNK_SIZE = 4096
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Tasks handed to a thread pool worker at once
+POOL_CHUNK_SIZE = 256
+
+# Progress bar is refreshed once per this amount of operations
+# (must be power of two)
+PROGRESS_STRIDE = 1024
+
+
+def gen_data(path, n, task_id: TaskID, *, processes):
+    # Appending mode would redirect the final header write to the end
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    with open(fd, "r+b", buffering=WRITE_BUFFER_SIZE) as fp:
         head = fp.read(DATA_HEADER.size)
 
         if len(head) == DATA_HEADER.size and DATA_HEADER.unpack(head)[0] == n:
@@ -230,59 +335,145 @@ def gen_data(path, n, task_id: TaskID):
             return
 
         fp.truncate(0)
-        fp.flush()
+        fp.seek(0)
 
-        fp.write(b"\x00" * DATA_HEADER.size)
+        fp.write(EMPTY_HEADER)
 
         progress.start_task(task_id)
-        track = progress.track(
-            range(n), task_id=task_id, total=n,
-        )
 
-        for i in track:
-            value = get_value(i)
-            fp.write(DATA_HEADER.pack(len(value)))
-            fp.write(value)
+        # The pools are built once and handed to every worker, so all
+        # of them sample the same pools whatever the start method is
+        with ProcessPoolExecutor(
+            processes, initializer=set_pools, initargs=(build_pools(),),
+        ) as executor:
+            values = executor.map(
+                get_value, range(n), chunksize=GEN_CHUNK_SIZE,
+            )
+
+            pack_into = DATA_HEADER.pack_into
+            chunk = bytearray()
+
+            for i, value in enumerate(values, 1):
+                # Reserve the header and pack the length in place
+                offset = len(chunk)
+                chunk += EMPTY_HEADER
+                pack_into(chunk, offset, len(value))
+                chunk += value
+
+                if not i % GEN_CHUNK_SIZE:
+                    fp.write(chunk)
+                    chunk.clear()
+
+                if not i & (PROGRESS_STRIDE - 1):
+                    progress.update(task_id, completed=i)
+
+            fp.write(chunk)
+            progress.update(task_id, completed=n)
 
         fp.seek(0)
-        os.pwrite(fp.fileno(), DATA_HEADER.pack(n), 0)
+        fp.write(DATA_HEADER.pack(n))
         fp.flush()
         progress.stop_task(task_id)
 
 
-def fill_db(path, *, pool_size, data_file, **kwargs):
-    with ThreadPool(pool_size) as pool, \
-         lsm.LSM(path, **kwargs) as db, \
-         open(data_file, "rb") as fp:
+def map_data_file(fp) -> mmap.mmap:
+    if not hasattr(mmap, "MAP_SHARED"):
+        return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
 
-        n = DATA_HEADER.unpack(fp.read(DATA_HEADER.size))[0]
-        read_lock = RLock()
+    # Populate the page tables up front, the whole file will be read
+    return mmap.mmap(
+        fp.fileno(), 0, prot=mmap.PROT_READ,
+        flags=mmap.MAP_SHARED | getattr(mmap, "MAP_POPULATE", 0),
+    )
 
-        task_id = progress.add_task(
-            description=(
-                f"Fill DB "
-                f"[bold green]compress={kwargs.get('compress', 'none')}"
-            ), total=n,
-        )
 
-        count = 0
+def index_records(data, n) -> Tuple[array, array]:
+    offsets = array("q", [0]) * n
+    lengths = array("I", [0]) * n
 
-        def insert(i):
-            nonlocal count
+    offset = DATA_HEADER.size
+    for i in range(n):
+        length = DATA_HEADER.unpack_from(data, offset)[0]
+        offset += DATA_HEADER.size
+        offsets[i] = offset
+        lengths[i] = length
+        offset += length
 
-            with read_lock:
-                line = fp.read(
-                    DATA_HEADER.unpack(fp.read(DATA_HEADER.size))[0],
-                )
+    return offsets, lengths
 
-            db[get_key(i)] = line
-            count += 1
+
+def insert_sequentially(db, data, n, task_id: TaskID):
+    unpack_from = DATA_HEADER.unpack_from
+    header_size = DATA_HEADER.size
+    offset = header_size
+
+    db.begin()
+    for i in range(n):
+        start = offset + header_size
+        offset = start + unpack_from(data, offset)[0]
+        db[get_key(i)] = data[start:offset]
+
+        if not (i + 1) % INSERT_BATCH_SIZE:
+            db.commit()
+            db.begin()
+
+        if not i & (PROGRESS_STRIDE - 1):
+            progress.update(task_id, completed=i)
+    db.commit()
+
+    progress.update(task_id, completed=n)
+
+
+def insert_thread_pool(db, data, n, task_id: TaskID, *, pool_size):
+    offsets, lengths = index_records(data, n)
+    count = 0
+
+    def insert(i):
+        nonlocal count
+
+        offset = offsets[i]
+        db[get_key(i)] = data[offset:offset + lengths[i]]
+        count += 1
+
+        if not count & (PROGRESS_STRIDE - 1):
             progress.update(task_id, completed=count)
 
-        for _ in pool.imap_unordered(insert, range(n)):
+    with ThreadPool(pool_size) as pool:
+        for _ in pool.imap_unordered(insert, range(n), POOL_CHUNK_SIZE):
             pass
 
-        db.work(complete=True)
+    progress.update(task_id, completed=n)
+
+
+def fadvise(fp, advice: str):
+    # posix_fadvise is not available on macOS and Windows
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fp.fileno(), 0, 0, getattr(os, advice))
+
+
+def fill_db(path, *, pool_size, data_file, threaded=False, **kwargs):
+    with open(data_file, "rb") as fp:
+        fadvise(fp, "POSIX_FADV_SEQUENTIAL")
+
+        with lsm.LSM(path, **kwargs) as db, map_data_file(fp) as data:
+            n = DATA_HEADER.unpack_from(data, 0)[0]
+
+            task_id = progress.add_task(
+                description=(
+                    f"Fill DB "
+                    f"[bold green]compress={kwargs.get('compress', 'none')}"
+                ), total=n,
+            )
+
+            if threaded:
+                insert_thread_pool(db, data, n, task_id, pool_size=pool_size)
+            else:
+                insert_sequentially(db, data, n, task_id)
+
+            db.work(complete=True)
+
+        # The data file is read once, don't keep it in the page cache
+        fadvise(fp, "POSIX_FADV_DONTNEED")
 
 
 def select_thread_pool(
@@ -291,8 +482,13 @@ def select_thread_pool(
     tls = local()
     db_pool = set()
 
+    def open_db():
+        tls.db = lsm.LSM(path, readonly=True, **kwargs)
+        tls.db.open()
+        db_pool.add(tls.db)
+
     log.info("Opening: %s with %r", path, kwargs)
-    with ThreadPool(pool_size) as pool:
+    with ThreadPool(pool_size, initializer=open_db) as pool:
         task_id = progress.add_task(
             description=(
                 f"[bold blue]Select all keys sequentially "
@@ -304,23 +500,42 @@ def select_thread_pool(
 
         def select(k):
             nonlocal count
-            if not hasattr(tls, "db"):
-                tls.db = lsm.LSM(path, readonly=True, **kwargs)
-                tls.db.open()
-                db_pool.add(tls.db)
 
             _ = tls.db[get_key(k)]
             count += 1
-            progress.update(task_id=task_id, completed=count)
+
+            if not count & (PROGRESS_STRIDE - 1):
+                progress.update(task_id=task_id, completed=count)
             return 0
 
-        for _ in pool.imap_unordered(select, keys_iter):
+        for _ in pool.imap_unordered(select, keys_iter, POOL_CHUNK_SIZE):
             pass
 
+        progress.update(task_id=task_id, completed=count)
+
         for conn in db_pool:
             conn.close()
 
 
+def scan_seq(path, **kwargs):
+    with lsm.LSM(path, readonly=True, **kwargs) as db:
+        task_id = progress.add_task(
+            description=(
+                f"[bold blue]Scan all items with cursor "
+                f"[bold green]compress={kwargs.get('compress', 'none')}"
+            ), total=len(db),
+        )
+
+        count = 0
+        for _ in db.items():
+            count += 1
+
+            if not count & (PROGRESS_STRIDE - 1):
+                progress.update(task_id, completed=count)
+
+        progress.update(task_id, completed=count)
+
+
 def copy_seq(path, **kwargs):
     with tempfile.TemporaryDirectory() as dest:
         dest = lsm.LSM(os.path.join(dest, "lsm-copy"), **kwargs)
@@ -331,13 +546,25 @@ def copy_seq(path, **kwargs):
 
             task_id = progress.add_task(
                 description=f"Copy [bold green]{kwargs.get('compress', 'none')}",
+                total=total_keys,
             )
-            track = progress.track(
-                src.items(), task_id=task_id, total=total_keys,
-            )
 
-            for key, value in track:
-                dest[key] = value
+            count = 0
+            with src.cursor() as cursor:
+                cursor.first()
+
+                while True:
+                    batch = cursor.fetch_many(INSERT_BATCH_SIZE)
+                    if not batch:
+                        break
+
+                    # One transaction per batch
+                    dest.begin()
+                    dest.update(dict(batch))
+                    dest.commit()
+
+                    count += len(batch)
+                    progress.update(task_id, completed=count)
 
 
 def run_parallel(func, cases):
@@ -353,16 +580,19 @@ def run_sequentially(func, cases):
 
 def main():
     arguments = parser.parse_args()
+    prepare_keys(arguments.count)
 
     run_insert = False
     run_select_seq = False
     run_select_rnd = False
+    run_scan_seq = False
     run_copy_seq = False
 
     if not arguments.benchmarks:
         run_insert = True
         run_select_seq = True
         run_select_rnd = True
+        run_scan_seq = True
         run_copy_seq = True
     else:
         if "insert" in arguments.benchmarks:
@@ -371,6 +601,8 @@ def main():
             run_select_seq = True
         if "select-rnd" in arguments.benchmarks:
             run_select_rnd = True
+        if "scan-seq" in arguments.benchmarks:
+            run_scan_seq = True
         if "copy-seq" in arguments.benchmarks:
             run_copy_seq = True
 
@@ -378,6 +610,7 @@ def main():
             run_insert = True
             run_select_seq = True
             run_select_rnd = True
+            run_scan_seq = True
             run_copy_seq = True
 
     if not arguments.cases or "all" in arguments.cases:
@@ -413,6 +646,7 @@ def main():
             path,
             pool_size=arguments.pool_size,
             data_file=data_path,
+            threaded=arguments.threaded_insert,
             **kwargs
         )
 
@@ -426,20 +660,25 @@ def main():
             **kwargs
         )
 
-    def select_random_job(item):
+    # Shared by all cases, every job iterates it independently
+    random_keys = array("I", range(arguments.count))
+    shuffle(random_keys)
 
+    def select_random_job(item):
         path, kwargs = item
-        keys = list(range(arguments.count))
-        shuffle(keys)
 
         return select_thread_pool(
             path,
             pool_size=arguments.pool_size,
-            keys_iter=iter(keys),
+            keys_iter=iter(random_keys),
             keys_total=arguments.count,
             **kwargs
         )
 
+    def scan_seq_job(item):
+        path, kwargs = item
+        return scan_seq(path, **kwargs)
+
     def copy_seq_job(item):
         path, kwargs = item
         return copy_seq(path, **kwargs)
@@ -448,8 +687,9 @@ def main():
         if run_insert:
             gen_data(
                 data_path, arguments.count, progress.add_task(
-                    description="Generate data",
+                    description="Generate data", total=arguments.count,
                 ),
+                processes=arguments.gen_processes,
             )
 
             run(fill_job, cases)
@@ -462,6 +702,10 @@ def main():
             log.info("Select all keys random")
             run(select_random_job, cases)
 
+        if run_scan_seq:
+            log.info("Scan all items sequentially")
+            run(scan_seq_job, cases)
+
         if run_copy_seq:
             log.info("Copy database")
             run(copy_seq_job, cases)
@@ -9,15 +9,32 @@ from aiomisc.service import MemoryTracer
 from lsm import LSM
 
 
+try:
+    from blake3 import blake3 as hash_factory
+except ImportError:
+    hash_factory = hashlib.sha256
+
+
+# Feed the hasher with blocks of this size instead of every key and value
+HASH_BLOCK_SIZE = 256 * 1024
+
+
 @aiomisc.threaded
 def seq_reader(fname: Path):
-    hasher = hashlib.md5()
+    hasher = hash_factory()
+    block = bytearray()
 
     logging.info("Start reading %s", fname)
     with LSM(fname, binary=True, readonly=True) as db:
         for key, value in db.items():
-            hasher.update(key)
-            hasher.update(value)
+            block += key
+            block += value
+
+            if len(block) >= HASH_BLOCK_SIZE:
+                hasher.update(block)
+                block.clear()
+
+    hasher.update(block)
 
     logging.info("DIGEST: %s", hasher.hexdigest())
     logging.info("Reading done for %s", fname)
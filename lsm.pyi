@@ -1,5 +1,5 @@
 from typing import (
-    Any, Callable, Dict, Union, Optional, Tuple,
+    Any, Callable, Dict, List, Union, Optional, Tuple,
     KeysView, ValuesView, ItemsView, Mapping
 )
 
@@ -39,6 +39,9 @@ class Cursor:
     ]: ...
     def next(self) -> bool: ...
     def previous(self) -> bool: ...
+    def fetch_many(
+        self, size: int = 1024
+    ) -> List[Tuple[Union[bytes, str], Union[bytes, str]]]: ...
     def compare(self, key: Union[bytes, str]) -> int: ...
     def __iter__(self) -> "Cursor": ...
     def __next__(self) -> Tuple[Union[bytes, str], Union[bytes, str]]: ...
@@ -99,6 +102,9 @@ class LSM:
         self, key: Union[bytes, str], value: Union[bytes, str]
     ) -> None: ...
     def delete(self, key: Union[bytes, str]) -> None: ...
+    def pop(
+        self, key: Union[bytes, str], default: Any = ...
+    ) -> Union[bytes, str, Any]: ...
     def delete_range(
         self, start: Union[bytes, str], end: Union[bytes, str]
     ) -> None: ...
@@ -1,7 +1,10 @@
 import os
 import platform
+import subprocess
+import sys
 
 from setuptools import Extension, setup
+from setuptools.command.build_ext import build_ext
 
 
 module_name = "lsm"
@@ -12,25 +15,26 @@ compiller_args = []
 libraries = []
 extra_link_args = []
 
-if platform.system() == 'Darwin':
+# Set LSM_DEBUG=1 to build without optimizations and keep debug symbols
+debug_build = bool(os.getenv("LSM_DEBUG"))
+
+if platform.system() == 'Darwin' and not debug_build:
     extra_link_args += ['-Wl,-s']
 
-if platform.system() == 'Linux':
+if platform.system() == 'Linux' and not debug_build:
     extra_link_args += ['-Wl,--strip-all']
 
 if platform.system() in ("Darwin", "Linux"):
     define_macros.append(('LSM_MUTEX_PTHREADS', None))
-    compiller_args += (
-        "-g3",
-        "-std=c99",
-        "-O0",
-        "-fPIC",
-        "-Wall",
-        "-ftrapv",
-        "-fwrapv",
-    )
+    compiller_args += ("-std=c99", "-fPIC", "-Wall", "-fwrapv")
     libraries.append("pthread")
 
+    if debug_build:
+        compiller_args += ("-g3", "-O0", "-ftrapv")
+    else:
+        compiller_args += ("-O3", "-flto")
+        extra_link_args += ["-O3", "-flto"]
+
 
 if platform.system() in ("Windows",):
     define_macros.append(('LSM_MUTEX_WIN32', None))
@@ -90,6 +94,78 @@ def library_sources():
     return result
 
 
+# Workload which is used to collect the profile for the --pgo build
+PGO_TRAINING_SCRIPT = """
+import os
+import tempfile
+
+from lsm import LSM
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for compress in ("none", "lz4", "zstd"):
+        path = os.path.join(tmp_dir, "train-%s.lsm" % compress)
+        with LSM(path, compress=compress, binary=True) as db:
+            db.begin()
+            for i in range(200000):
+                db[b"%08d" % i] = b"value %d " % i * 8
+            db.commit()
+
+            for _ in db.items():
+                pass
+
+            for i in range(0, 200000, 7):
+                assert db[b"%08d" % i]
+
+            db.work(complete=True)
+"""
+
+
+class BuildExt(build_ext):
+    user_options = build_ext.user_options + [
+        ("pgo", None, "build with profile guided optimization (gcc only)"),
+    ]
+    boolean_options = build_ext.boolean_options + ["pgo"]
+
+    def initialize_options(self):
+        super().initialize_options()
+        self.pgo = False
+
+    def build_extensions(self):
+        if not self.pgo:
+            return super().build_extensions()
+
+        if platform.system() != "Linux":
+            raise RuntimeError("--pgo build is supported only on Linux")
+
+        profile_dir = os.path.abspath(os.path.join(self.build_temp, "pgo"))
+        original_args = {
+            ext.name: (ext.extra_compile_args, ext.extra_link_args)
+            for ext in self.extensions
+        }
+
+        def build(*flags):
+            for ext in self.extensions:
+                compile_args, link_args = original_args[ext.name]
+                ext.extra_compile_args = compile_args + list(flags)
+                ext.extra_link_args = link_args + list(flags)
+            super(BuildExt, self).build_extensions()
+
+        build("-fprofile-generate=" + profile_dir)
+        self.train()
+
+        # Sources are unchanged, so the rebuild has to be forced
+        self.force = True
+        build("-fprofile-use=" + profile_dir, "-fprofile-correction")
+
+    def train(self):
+        ext_dir = os.path.dirname(
+            os.path.abspath(self.get_ext_fullpath(module_name)),
+        )
+        subprocess.check_call(
+            [sys.executable, "-c", PGO_TRAINING_SCRIPT], cwd=ext_dir,
+        )
+
+
 setup(
     name=module_name,
     version="0.4.4",
@@ -104,6 +180,7 @@ setup(
             extra_link_args=extra_link_args,
         ),
     ],
+    cmdclass={"build_ext": BuildExt},
     include_package_data=True,
     description="Python bindings for SQLite's LSM key/value engine",
     long_description=open("README.md").read(),
@@ -144,6 +221,7 @@ setup(
         "develop": [
             "pytest",
             "pytest-subtests",
+            "pytest-xdist",
         ],
     },
 )
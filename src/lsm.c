@@ -60,6 +60,7 @@ typedef struct {
 	lsm_cursor* cursor;
 	LSM*        db;
 	int 		seek_mode;
+	char		direction;
 	PyObject*	weakrefs;
 } LSMCursor;
 
@@ -130,6 +131,13 @@ enum {
 	PY_LSM_SLICE_BACKWARD = 1
 };
 
+/* Which way lsm1 lets the cursor move from the current position */
+enum {
+	PY_LSM_CURSOR_FORWARD = 0,
+	PY_LSM_CURSOR_BACKWARD = 1,
+	PY_LSM_CURSOR_FIXED = 2
+};
+
 enum {
 	PY_LSM_COMPRESSOR_EMPTY = LSM_COMPRESSION_EMPTY,
 	PY_LSM_COMPRESSOR_NONE = LSM_COMPRESSION_NONE,
@@ -223,26 +231,28 @@ static int pylsm_lz4_xUncompress(LSM* self, char *pOut, int *pnOut, const char *
 }
 
 
-static size_t pylsm_zstd_xBound(LSM* self, int nIn) {
-	return ZSTD_compressBound(nIn);
+static int pylsm_zstd_xBound(LSM* self, int nIn) {
+	size_t rc = ZSTD_compressBound(nIn);
+	assert(rc <= INT_MAX);
+	return (int) rc;
 }
 
 
-static size_t pylsm_zstd_xCompress(LSM* self, char *pOut, Py_ssize_t *pnOut, const char *pIn, int nIn) {
+static int pylsm_zstd_xCompress(LSM* self, char *pOut, int *pnOut, const char *pIn, int nIn) {
 	size_t rc = ZSTD_compress(pOut, *pnOut, pIn, nIn, self->compress_level);
 
 	assert(!ZSTD_isError(rc));
 
-	*pnOut = rc;
+	*pnOut = (int) rc;
 	return LSM_OK;
 }
 
 
-static int pylsm_zstd_xUncompress(LSM* self, char *pOut, Py_ssize_t *pnOut, const char *pIn, int nIn) {
-  Py_ssize_t rc = ZSTD_decompress((char*)pOut, *pnOut, (const char*)pIn, nIn);
-  assert(!ZSTD_isError(rc));
-  *pnOut = rc;
-  return 0;
+static int pylsm_zstd_xUncompress(LSM* self, char *pOut, int *pnOut, const char *pIn, int nIn) {
+	size_t rc = ZSTD_decompress((char*)pOut, *pnOut, (const char*)pIn, nIn);
+	assert(!ZSTD_isError(rc));
+	*pnOut = (int) rc;
+	return LSM_OK;
 }
 
 
@@ -371,6 +381,34 @@ static int pylsm_delitem(
 }
 
 
+static int pylsm_popitem(
+	lsm_db* lsm,
+	int tx_level,
+	const char * pKey,
+	int nKey,
+	char** ppVal,
+	int* pnVal
+) {
+	int rc;
+
+	/* The lookup and the delete share one write transaction */
+	if ((rc = lsm_begin(lsm, tx_level + 1))) return rc;
+
+	rc = pylsm_getitem(lsm, pKey, nKey, ppVal, pnVal, LSM_SEEK_EQ);
+	if (rc == 0) rc = lsm_delete(lsm, pKey, nKey);
+
+	if (rc == 0 || rc == -1) {
+		/* Nothing was written when the key is missing */
+		int commit_rc = lsm_commit(lsm, tx_level);
+		return commit_rc ? commit_rc : rc;
+	}
+
+	lsm_rollback(lsm, tx_level + 1);
+	lsm_commit(lsm, tx_level);
+	return rc;
+}
+
+
 static int pylsm_contains(lsm_db* lsm, const char* pKey, int nKey) {
 	int rc;
 	lsm_cursor *cursor;
@@ -1564,6 +1602,61 @@ static PyObject* LSM_delete(LSM *self, PyObject *args, PyObject *kwds) {
 }
 
 
+static PyObject* LSM_pop(LSM *self, PyObject *args, PyObject *kwds) {
+	if (pylsm_ensure_writable(self)) return NULL;
+
+	static char *kwlist[] = {"key", "default", NULL};
+
+	PyObject* key = NULL;
+	PyObject* default_value = NULL;
+	const char* pKey = NULL;
+	Py_ssize_t nKey = 0;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O", kwlist, &key, &default_value)) return NULL;
+	if (str_or_bytes_check(self->binary, key, &pKey, &nKey)) return NULL;
+
+	if (nKey >= INT_MAX) {
+		PyErr_SetString(PyExc_OverflowError, "length of key is too large");
+		return NULL;
+	}
+
+	int result;
+	char *pValue = NULL;
+	int nValue = 0;
+
+	Py_BEGIN_ALLOW_THREADS
+	LSM_MutexLock(self);
+	result = pylsm_popitem(self->lsm, self->tx_level, pKey, (int) nKey, &pValue, &nValue);
+	LSM_MutexLeave(self);
+	Py_END_ALLOW_THREADS
+
+	if (result == -1) {
+		if (default_value != NULL) {
+			Py_INCREF(default_value);
+			return default_value;
+		}
+
+		PyErr_Format(
+			PyExc_KeyError,
+			"Key %R was not found",
+			key
+		);
+		return NULL;
+	}
+
+	if (pylsm_error(result)) {
+		if (pValue != NULL) free(pValue);
+		return NULL;
+	}
+
+	PyObject* py_value = Py_BuildValue(self->binary ? "y#" : "s#", pValue, (Py_ssize_t) nValue);
+
+	if (pValue != NULL) free(pValue);
+
+	return py_value;
+}
+
+
 static PyObject* LSM_delete_range(LSM *self, PyObject *args, PyObject *kwds) {
 	if (pylsm_ensure_writable(self)) return NULL;
 
@@ -1873,11 +1966,16 @@ static PyObject* LSM_rollback(LSM *self) {
 	int result;
 	Py_BEGIN_ALLOW_THREADS
 	LSM_MutexLock(self);
+	/* Rolling back to a level leaves it open, so close it afterwards */
 	result = lsm_rollback(self->lsm, self->tx_level);
+	if (result == LSM_OK && self->tx_level > 0) {
+		result = lsm_commit(self->lsm, self->tx_level - 1);
+	}
 	LSM_MutexLeave(self);
 	Py_END_ALLOW_THREADS
 
 	self->tx_level--;
+
 	if (pylsm_error(result)) return NULL;
 	if (self->tx_level < 0) self->tx_level = 0;
 	Py_RETURN_TRUE;
@@ -2087,13 +2185,9 @@ static LSMTransaction* LSM_transaction(LSM* self) {
 	if (PyErr_Occurred()) return NULL;
 
 	LSMTransaction* tx = (LSMTransaction*) LSMTransaction_new(&LSMTransactionType, self);
-	tx->tx_level = self->tx_level;
-	tx->db = self;
-
-	Py_INCREF(tx->db);
-
-	if (PyErr_Occurred()) return NULL;
+	if (tx == NULL) return NULL;
 
+	tx->tx_level = self->tx_level;
 	return tx;
 }
 
@@ -2271,6 +2365,11 @@ static PyMethodDef LSM_methods[] = {
 		(PyCFunction) LSM_delete, METH_VARARGS | METH_KEYWORDS,
 		"Delete value by key"
 	},
+	{
+		"pop",
+		(PyCFunction) LSM_pop, METH_VARARGS | METH_KEYWORDS,
+		"Delete key and return its value"
+	},
 	{
 		"delete_range",
 		(PyCFunction) LSM_delete_range, METH_VARARGS | METH_KEYWORDS,
@@ -2374,6 +2473,9 @@ static PyObject* LSMCursor_new(PyTypeObject *type, LSM *db) {
 
 	self = (LSMCursor *) type->tp_alloc(type, 0);
 	self->state = PY_LSM_INITIALIZED;
+	/* Not positioned yet, the same mode first() and last() use */
+	self->seek_mode = LSM_SEEK_LEFAST;
+	self->direction = PY_LSM_CURSOR_FORWARD;
 	self->db = db;
 
 	int rc;
@@ -2417,6 +2519,7 @@ static PyObject* LSMCursor_first(LSMCursor *self) {
 	int result;
 
 	self->seek_mode = LSM_SEEK_LEFAST;
+	self->direction = PY_LSM_CURSOR_FORWARD;
 
 	Py_BEGIN_ALLOW_THREADS
 	LSM_MutexLock(self->db);
@@ -2440,6 +2543,7 @@ static PyObject* LSMCursor_last(LSMCursor *self) {
 	int result;
 
 	self->seek_mode = LSM_SEEK_LEFAST;
+	self->direction = PY_LSM_CURSOR_BACKWARD;
 
 	Py_BEGIN_ALLOW_THREADS
 	LSM_MutexLock(self->db);
@@ -2486,6 +2590,18 @@ static PyObject* LSMCursor_seek(LSMCursor *self, PyObject* args, PyObject* kwds)
 	if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|I", kwlist, &key, &self->seek_mode)) return NULL;
 	if (pylsm_seek_mode_check(self->seek_mode)) return NULL;
 
+	switch (self->seek_mode) {
+		case LSM_SEEK_GE:
+			self->direction = PY_LSM_CURSOR_FORWARD;
+			break;
+		case LSM_SEEK_LE:
+			self->direction = PY_LSM_CURSOR_BACKWARD;
+			break;
+		default:
+			self->direction = PY_LSM_CURSOR_FIXED;
+			break;
+	}
+
 	int rc;
 
 	if (str_or_bytes_check(self->db->binary, key, &pKey, &nKey)) return NULL;
@@ -2628,6 +2744,67 @@ static PyObject* LSMCursor_previous(LSMCursor *self) {
 }
 
 
+static PyObject* LSMCursor_fetch_many(LSMCursor *self, PyObject* args, PyObject* kwds) {
+	if (self->state == PY_LSM_ITERATING) {
+		PyErr_SetString(PyExc_RuntimeError, "can not change cursor during iteration");
+		return NULL;
+	}
+	if (pylsm_ensure_csr_opened(self)) return NULL;
+	if (self->seek_mode == LSM_SEEK_EQ) {
+		PyErr_SetString(PyExc_RuntimeError, "can not seek in SEEK_EQ mode");
+		return NULL;
+	}
+	if (self->direction == PY_LSM_CURSOR_FIXED) {
+		PyErr_SetString(PyExc_RuntimeError, "can not seek in SEEK_LEFAST mode");
+		return NULL;
+	}
+
+	static char *kwlist[] = {"size", NULL};
+	Py_ssize_t size = 1024;
+
+	if (!PyArg_ParseTupleAndKeywords(args, kwds, "|n", kwlist, &size)) return NULL;
+
+	if (size < 1) {
+		PyErr_Format(PyExc_ValueError, "size must be positive, got %zd", size);
+		return NULL;
+	}
+
+	PyObject* result = PyList_New(0);
+	if (result == NULL) return NULL;
+
+	PyObject* item;
+	int rc = 0;
+
+	LSM_MutexLock(self->db);
+
+	while (PyList_GET_SIZE(result) < size && lsm_csr_valid(self->cursor)) {
+		item = pylsm_cursor_items_fetch(self->cursor, self->db->binary);
+		if (item == NULL) break;
+
+		rc = PyList_Append(result, item);
+		Py_DECREF(item);
+		if (rc) break;
+
+		/* Cursors positioned by last() or SEEK_LE can only move backward */
+		if (self->direction == PY_LSM_CURSOR_BACKWARD) {
+			rc = lsm_csr_prev(self->cursor);
+		} else {
+			rc = lsm_csr_next(self->cursor);
+		}
+		if (pylsm_error(rc)) break;
+	}
+
+	LSM_MutexLeave(self->db);
+
+	if (PyErr_Occurred()) {
+		Py_DECREF(result);
+		return NULL;
+	}
+
+	return result;
+}
+
+
 static PyObject* LSMCursor_ctx_enter(LSMCursor *self) {
 	if (self->state == PY_LSM_ITERATING) {
 		PyErr_SetString(PyExc_RuntimeError, "can not change cursor during iteration");
@@ -2785,6 +2962,11 @@ static PyMethodDef LSMCursor_methods[] = {
 		(PyCFunction) LSMCursor_previous, METH_NOARGS,
 		"Seek previous"
 	},
+	{
+		"fetch_many",
+		(PyCFunction) LSMCursor_fetch_many, METH_VARARGS | METH_KEYWORDS,
+		"Retrieve up to size items and move cursor past them"
+	},
 	{
 		"compare",
 		(PyCFunction) LSMCursor_compare, METH_VARARGS | METH_KEYWORDS,
@@ -2815,6 +2997,8 @@ static PyObject* LSMTransaction_new(PyTypeObject *type, LSM* db) {
 	LSMTransaction *self;
 
 	self = (LSMTransaction *) type->tp_alloc(type, 0);
+	if (self == NULL) return NULL;
+
 	self->state = PY_LSM_INITIALIZED;
 
 	self->db = db;
@@ -2825,24 +3009,49 @@ static PyObject* LSMTransaction_new(PyTypeObject *type, LSM* db) {
 
 
 static void LSMTransaction_dealloc(LSMTransaction *self) {
-	if (self->state == PY_LSM_CLOSED) return;
-	if (self->db != NULL) Py_DECREF(self->db);
+	/* A transaction dropped without commit or rollback is rolled back */
+	if (
+		self->state != PY_LSM_CLOSED &&
+		self->db != NULL &&
+		self->db->state == PY_LSM_OPENED &&
+		self->tx_level == self->db->tx_level
+	) {
+		PyObject *exc_type, *exc_value, *exc_tb;
+		PyErr_Fetch(&exc_type, &exc_value, &exc_tb);
+
+		PyObject* result = LSM_rollback(self->db);
+		if (result == NULL) {
+			PyErr_WriteUnraisable((PyObject *) self);
+		} else {
+			Py_DECREF(result);
+		}
+
+		PyErr_Restore(exc_type, exc_value, exc_tb);
+	}
+
+	if (self->db != NULL) {
+		Py_DECREF(self->db);
+		self->db = NULL;
+	}
+
 	if (self->weakrefs != NULL) PyObject_ClearWeakRefs((PyObject *) self);
 }
 
 
 static PyObject* LSMTransaction_ctx_enter(LSMTransaction *self) {
 	if (pylsm_ensure_writable(self->db)) return NULL;
+	Py_INCREF(self);
 	return (PyObject*) self;
 }
 
 
 static PyObject* LSMTransaction_ctx_exit(
 	LSMTransaction *self,
-	PyObject *exc_type,
-	PyObject *exc_value,
-	PyObject *exc_tb
+	PyObject *args
 ) {
+	PyObject *exc_type, *exc_value, *exc_tb;
+	if (!PyArg_ParseTuple(args, "OOO", &exc_type, &exc_value, &exc_tb)) return NULL;
+
 	if (self->state == PY_LSM_CLOSED) Py_RETURN_NONE;
 
 	self->state = PY_LSM_CLOSED;
@@ -2881,7 +3090,7 @@ static PyMethodDef LSMTransaction_methods[] = {
 	},
 	{
 		"__exit__",
-		(PyCFunction) LSMTransaction_ctx_exit, METH_VARARGS | METH_KEYWORDS,
+		(PyCFunction) LSMTransaction_ctx_exit, METH_VARARGS,
 		"Exit context"
 	},
 	{
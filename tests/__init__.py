@@ -1 +1,5 @@
-comp_algo = ["none", "lz4", "zstd"]
+import os
+
+
+# CI runs every compressor, set LSM_COMP_ALGO="none,lz4,zstd" to do it locally
+comp_algo = os.environ.get("LSM_COMP_ALGO", "none").split(",")
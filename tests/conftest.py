@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from tests import comp_algo
+
+
+# Memory backed filesystem, databases in the tests never outlive the run
+SHM_PATH = "/dev/shm"
+
+
+@pytest.fixture(scope="session")
+def fast_tmp_path_factory(tmp_path_factory):
+    if not os.path.isdir(SHM_PATH):
+        yield tmp_path_factory.mktemp
+        return
+
+    root = tempfile.mkdtemp(
+        prefix="pytest-lsm-{}-".format(os.getpid()), dir=SHM_PATH,
+    )
+
+    def mktemp(name: str) -> Path:
+        return Path(tempfile.mkdtemp(prefix=name, dir=root))
+
+    try:
+        yield mktemp
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@pytest.fixture
+def fast_tmp_path(fast_tmp_path_factory) -> Path:
+    return fast_tmp_path_factory("test")
+
+
+@pytest.fixture(scope="session", params=comp_algo, ids=comp_algo)
+def compress(request) -> str:
+    return request.param
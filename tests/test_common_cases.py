@@ -1,7 +1,7 @@
 import struct
 
 import pytest
-from lsm import LSM, SEEK_LE, SEEK_GE, SEEK_EQ
+from lsm import LSM, SEEK_LE, SEEK_LEFAST, SEEK_GE, SEEK_EQ
 
 from tests import comp_algo
 
@@ -26,12 +26,19 @@ def db_binary(request, tmp_path):
         yield db
 
 
+_STRUCT_CACHE = {}
+
+
+def make_key(*args):
+    packer = _STRUCT_CACHE.get(len(args))
+    if packer is None:
+        packer = struct.Struct("!" + "b" * len(args))
+        _STRUCT_CACHE[len(args)] = packer
+    return packer.pack(*args)
+
+
 @pytest.mark.parametrize("n", range(1, 10))
 def test_ranges(n, subtests, db_binary: LSM):
-    def make_key(*args):
-        result = struct.pack("!" + "b" * len(args), *args)
-        return result
-
     for i in range(n):
         for j in range(n):
             key = make_key(i, j, 0)
@@ -42,6 +49,11 @@ def test_ranges(n, subtests, db_binary: LSM):
         assert len(s) == n, s
 
 
+KEYS = ["k{}".format(i) for i in range(100)]
+VALUES = [str(i) for i in range(100)]
+RECORDS = list(zip(KEYS, VALUES))
+
+
 def test_insert_select(subtests, db):
     with subtests.test("one key"):
         db["foo"] = "bar"
@@ -63,26 +75,24 @@ def test_insert_select(subtests, db):
         assert list(db.items()) == []
 
     with subtests.test("100 keys"):
-        for i in range(100):
-            db['k{}'.format(i)] = str(i)
+        for key, value in RECORDS:
+            db[key] = value
 
         assert len(db) == 100
-        assert set(db) == set('k{}'.format(i) for i in range(100))
-        assert set(db.keys()) == set('k{}'.format(i) for i in range(100))
-        assert set(db.values()) == set(str(i) for i in range(100))
-        assert set(db.items()) == set(
-            ('k{}'.format(i), str(i)) for i in range(100)
-        )
+        assert set(db) == set(KEYS)
+        assert set(db.keys()) == set(KEYS)
+        assert set(db.values()) == set(VALUES)
+        assert set(db.items()) == set(RECORDS)
 
     with subtests.test("slice select ['k90':'k99']"):
-        assert list(db['k90':'k99']) == list(
-            ('k{}'.format(i), str(i)) for i in range(90, 100)
-        )
+        assert list(db['k90':'k99']) == [
+            RECORDS[i] for i in range(90, 100)
+        ]
 
     with subtests.test("slice select ['k90':'k99':-1]"):
-        assert list(db['k90':'k99':-1]) == list(
-            ('k{}'.format(i), str(i)) for i in range(99, 89, -1)
-        )
+        assert list(db['k90':'k99':-1]) == [
+            RECORDS[i] for i in range(99, 89, -1)
+        ]
 
     with subtests.test("select ['k90xx', SEEK_LE]"):
         assert db['k90xx', SEEK_LE] == '90'
@@ -99,11 +109,135 @@ def test_insert_select(subtests, db):
         assert len(db) == 0
 
     with subtests.test("update"):
-        db.update({"k{}".format(i): str(i) for i in range(100)})
+        db.update(dict(RECORDS))
         assert len(db) == 100
         assert db['k19'] == '19'
 
 
+def test_cursor_fetch_many(subtests, db_binary: LSM):
+    expected = [(b"%04d" % i, b"%d" % i) for i in range(1000)]
+    db_binary.update(dict(expected))
+
+    with subtests.test("batches"):
+        with db_binary.cursor() as cursor:
+            cursor.first()
+            batches = []
+
+            while True:
+                batch = cursor.fetch_many(300)
+                if not batch:
+                    break
+                batches.append(batch)
+
+        assert list(map(len, batches)) == [300, 300, 300, 100]
+        assert [item for batch in batches for item in batch] == expected
+
+    with subtests.test("from seek position"):
+        with db_binary.cursor() as cursor:
+            cursor.seek(b"0995", SEEK_GE)
+            assert cursor.fetch_many() == expected[995:]
+            assert cursor.fetch_many() == []
+
+    with subtests.test("backward from last"):
+        with db_binary.cursor() as cursor:
+            cursor.last()
+            assert cursor.fetch_many(3) == expected[:-4:-1]
+            assert cursor.fetch_many() == expected[-4::-1]
+            assert cursor.fetch_many() == []
+
+    with subtests.test("backward from SEEK_LE"):
+        with db_binary.cursor() as cursor:
+            cursor.seek(b"0004x", SEEK_LE)
+            assert cursor.fetch_many() == expected[4::-1]
+
+    with subtests.test("not positioned"):
+        with db_binary.cursor() as cursor:
+            assert cursor.fetch_many() == []
+
+    with subtests.test("invalid size"):
+        with db_binary.cursor() as cursor:
+            cursor.first()
+            with pytest.raises(ValueError):
+                cursor.fetch_many(0)
+
+    with subtests.test("SEEK_EQ"):
+        with db_binary.cursor() as cursor:
+            cursor.seek(b"0001", SEEK_EQ)
+            with pytest.raises(RuntimeError):
+                cursor.fetch_many()
+
+    with subtests.test("SEEK_LEFAST"):
+        with db_binary.cursor() as cursor:
+            cursor.seek(b"0001", SEEK_LEFAST)
+            with pytest.raises(RuntimeError):
+                cursor.fetch_many()
+
+
+def test_transaction(subtests, db):
+    with subtests.test("commit on exit"):
+        with db.transaction():
+            db["foo"] = "bar"
+
+        assert db["foo"] == "bar"
+
+    with subtests.test("rollback on exception"):
+        with pytest.raises(ZeroDivisionError):
+            with db.transaction():
+                db["spam"] = "eggs"
+                _ = 1 / 0
+
+        assert "spam" not in db
+
+    with subtests.test("nested rollback"):
+        with db.transaction():
+            db["outer"] = "1"
+
+            with db.transaction() as txn:
+                db["inner"] = "2"
+                txn.rollback()
+
+        assert db["outer"] == "1"
+        assert "inner" not in db
+
+    with subtests.test("rollback on dealloc"):
+        txn = db.transaction()
+        db["dropped"] = "1"
+        del txn
+
+        assert "dropped" not in db
+
+    # The handle must not be left inside a transaction
+    db.close()
+
+
+def test_pop_in_transaction(db):
+    db["foo"] = "bar"
+
+    with pytest.raises(ZeroDivisionError):
+        with db.transaction():
+            assert db.pop("foo") == "bar"
+            assert "foo" not in db
+            _ = 1 / 0
+
+    # pop() must not commit the enclosing transaction
+    assert db["foo"] == "bar"
+
+
+@pytest.mark.parametrize("comp", comp_algo)
+def test_compressed_segments(comp, tmp_path):
+    records = {b"%08d" % i: b"value %d " % i * 8 for i in range(1000)}
+
+    with LSM(tmp_path / ("test.lsm." + comp), compress=comp,
+             binary=True) as db:
+        db.update(records)
+
+        # Move the records from the in-memory tree to (compressed) segments
+        db.flush()
+        db.work(complete=True)
+
+        assert dict(db.items()) == records
+
+
 @pytest.mark.parametrize("comp", comp_algo)
 def test_info(comp, tmp_path):
     with LSM(tmp_path / ("test.lsm." + comp), compress=comp,
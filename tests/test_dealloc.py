@@ -1,22 +1,21 @@
-from concurrent.futures import Future
+import os
+from threading import Event
 from typing import Any
-from weakref import finalize
+from weakref import ref
 
 import lsm
 import pytest
 
 
-# noinspection PyMethodMayBeStatic,SpellCheckingInspection
-from tests import comp_algo
-
-
 class DeallocCases:
     TIMEOUT = 1
 
     def test_weakref_finalize(self, instance_maker):
-        future = Future()
-        finalize(instance_maker(), future.set_result, True)
-        future.result(timeout=1)
+        event = Event()
+        # The reference has to outlive the instance to get the callback
+        instance_ref = ref(instance_maker(), lambda _: event.set())
+        assert event.wait(self.TIMEOUT)
+        assert instance_ref() is None
 
 
 class TestDeallocClass(DeallocCases):
@@ -35,109 +34,60 @@ class TestDeallocClass(DeallocCases):
 
 
 class TestLSMDealloc(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
+    @pytest.fixture
+    def instance_maker(self, compress, fast_tmp_path) -> Any:
         def maker():
             return lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
+                fast_tmp_path / ("db.lsm." + compress),
+                compress=compress, use_log=False,
             )
         return maker
 
 
-class TestLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db.keys()
-        return maker
-
+@pytest.fixture(scope="session")
+def empty_db(compress, fast_tmp_path_factory):
+    path = fast_tmp_path_factory("dealloc") / ("db.lsm." + compress)
+    with lsm.LSM(path, compress=compress, use_log=False) as db:
+        yield db
 
-class TestLSMValuesDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db.values()
-        return maker
-
-
-class TestLSMItemsDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db.items()
-        return maker
 
+# Set LSM_FILLER_SIZES="1,10,25,50,100,256,1024,2048" for an exhaustive run
+FILLER_SIZES = list(
+    map(int, os.environ.get("LSM_FILLER_SIZES", "1,100,2048").split(","))
+)
 
-class TestLSMSliceDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db[::-1]
-        return maker
+_KEYS = {n: [b"%d" % i for i in range(n)] for n in FILLER_SIZES}
 
 
-class TestLSMCursorDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db.cursor()
-        return maker
+@pytest.fixture(scope="session", params=FILLER_SIZES)
+def filler(request):
+    keys = _KEYS[request.param]
+    records = dict(zip(keys, keys))
 
+    def fill_db(db: lsm.LSM):
+        with db.transaction():
+            db.update(records)
 
-class TestLSMTransactionDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            return db.transaction()
-        return maker
+        # The filled cases are meaningless if the records were not kept
+        assert len(db) == len(records)
+    return fill_db
 
 
-@pytest.fixture(params=[1, 10, 25, 50, 100, 256, 1024, 2048])
-def filler(request):
-    def fill_db(db: lsm.LSM):
-        for i in range(request.param):
-            db[str(i).encode()] = str(i).encode()
-    return fill_db
+@pytest.fixture(scope="session")
+def filled_db(compress, fast_tmp_path_factory, filler):
+    path = fast_tmp_path_factory("dealloc") / ("db.lsm." + compress)
+    with lsm.LSM(path, compress=compress, use_log=False) as db:
+        filler(db)
+        yield db
 
 
 class TestFilledLSMDealloc(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
+    @pytest.fixture
+    def instance_maker(self, compress, fast_tmp_path, filler) -> Any:
         def maker():
             db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
+                fast_tmp_path / ("db.lsm." + compress),
+                compress=compress, use_log=False,
             )
             db.open()
             filler(db)
@@ -145,237 +95,52 @@ class TestFilledLSMDealloc(DeallocCases):
         return maker
 
 
-class TestFilledLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return db.keys()
-        return maker
+def checked_items(db: lsm.LSM):
+    for key, value in db.items():
+        assert key == value, (key, value)
+    return db.items()
 
 
-class TestFilledLSMValuesDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return db.values()
-        return maker
+VIEW_FACTORIES = [
+    ("keys", lambda db: db.keys()),
+    ("values", lambda db: db.values()),
+    ("items", lambda db: db.items()),
+    ("slice", lambda db: db[::-1]),
+    ("checked_items", checked_items),
+    ("cursor", lambda db: db.cursor()),
+    ("transaction", lambda db: db.transaction()),
+    ("iter", lambda db: iter(db)),
+    ("iter_keys", lambda db: iter(db.keys())),
+    ("iter_slice", lambda db: iter(db[::-1])),
+    ("iter_items", lambda db: iter(db.items())),
+    ("iter_checked_items", lambda db: iter(checked_items(db))),
+    ("iter_iter", lambda db: iter(iter(db))),
+    ("iter_iter_keys", lambda db: iter(iter(db.keys()))),
+    ("iter_iter_slice", lambda db: iter(iter(db[::-1]))),
+    ("iter_iter_items", lambda db: iter(iter(db.items()))),
+    ("iter_iter_checked_items", lambda db: iter(iter(checked_items(db)))),
+]
 
 
-class TestFilledLSMItemsDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return db.items()
-        return maker
+@pytest.fixture(
+    params=[factory for _, factory in VIEW_FACTORIES],
+    ids=[name for name, _ in VIEW_FACTORIES],
+)
+def view_factory(request):
+    return request.param
 
 
-class TestFilledAndCheckLSMDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-
-            for key, value in db.items():
-                assert key == value, (key, value)
-
-            return db.items()
-        return maker
-
-
-class TestFilledIterLSMDealloc(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(db)
-        return maker
-
-
-class TestFilledIterLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(db.keys())
-        return maker
-
-
-class TestFilledSliceLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(db.keys())
-        return maker
-
-
-class TestFilledIterLSMValuesDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(db[::-1])
-        return maker
-
-
-class TestFilledIterLSMItemsDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(db.items())
-        return maker
-
-
-class TestFilledIterAndCheckLSMDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-
-            for key, value in db.items():
-                assert key == value, (key, value)
-
-            return iter(db.items())
-        return maker
-
-
-class TestFilledIterIterLSMDealloc(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(iter(db))
-        return maker
-
-
-class TestFilledIterIterLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(iter(db.keys()))
-        return maker
-
-
-class TestFilledIterSliceLSMKeysDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(iter(db.keys()))
-        return maker
-
-
-class TestFilledIterIterLSMValuesDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
-        def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(iter(db[::-1]))
-        return maker
-
-
-class TestFilledIterIterLSMItemsDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
+class TestLSMViewDealloc(DeallocCases):
+    @pytest.fixture
+    def instance_maker(self, empty_db, view_factory) -> Any:
         def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-            return iter(iter(db.items()))
+            return view_factory(empty_db)
         return maker
 
 
-class TestFilledIterIterAndCheckLSMDeallocCtx(DeallocCases):
-    @pytest.fixture(params=comp_algo)
-    def instance_maker(self, request, tmp_path, filler) -> Any:
+class TestFilledLSMViewDealloc(DeallocCases):
+    @pytest.fixture
+    def instance_maker(self, filled_db, view_factory) -> Any:
         def maker():
-            db = lsm.LSM(
-                tmp_path / ("db.lsm." + request.param),
-                compress=request.param
-            )
-            db.open()
-            filler(db)
-
-            for key, value in db.items():
-                assert key == value, (key, value)
-
-            return iter(iter(db.items()))
+            return view_factory(filled_db)
         return maker
@@ -1,5 +1,4 @@
 from contextlib import contextmanager
-from pathlib import Path
 
 import pytest
 from lsm import LSM
@@ -7,11 +6,13 @@ from lsm import LSM
 from tests import comp_algo
 
 
-@pytest.fixture(params=comp_algo, ids=comp_algo)
-def db(request, tmp_path: Path):
-    db_path = tmp_path / ("readonly.lsm" + request.param)
-    with LSM(db_path, binary=False, multiple_processes=False) as db:
-        db.update({"k{}".format(i): str(i) for i in range(100000)})
+@pytest.fixture(scope="session", params=comp_algo, ids=comp_algo)
+def db(request, fast_tmp_path_factory):
+    db_path = fast_tmp_path_factory("ro") / ("readonly.lsm" + request.param)
+    with LSM(
+        db_path, binary=False, multiple_processes=False, use_log=False,
+    ) as db:
+        db.update({"k{}".format(i): str(i) for i in range(1000)})
 
     with LSM(
         db_path, readonly=True,
@@ -63,6 +64,11 @@ def test_readonly_delete(db: LSM):
         db.delete("foo")
 
 
+def test_readonly_pop(db: LSM):
+    with ensure_readonly():
+        db.pop("foo")
+
+
 def test_readonly_delitem(db: LSM):
     with ensure_readonly():
         del db["foo"]
@@ -1,89 +1,141 @@
 import pytest
-from lsm import LSM, SAFETY_OFF
+from lsm import LSM, SAFETY_OFF, SEEK_GE
 
 
-def test_multiple_open(subtests, tmp_path):
+# Test databases never have to survive a crash
+FAST_KW = {
+    'multiple_processes': False,
+    'safety': SAFETY_OFF,  # do not fsync manually
+    'use_log': False,
+}
+
+# Encoded decimal representations of small integers
+_ITOA = tuple(b"%d" % i for i in range(4096))
+
+
+@pytest.mark.parametrize(
+    "count", [64, pytest.param(2048, marks=pytest.mark.slow)],
+)
+def test_multiple_open(tmp_path, count):
+    path = str(tmp_path / "test.lsm")
     kwargs = {
         'autocheckpoint': 8 * 1024,  # 8 MB
+        # Larger than everything written by a single open, so the tree
+        # is only written by the explicit flush() below
         'autoflush': 8 * 1024,  # 8 MB
-        'multiple_processes': False,
-        'safety': SAFETY_OFF,  # do not fsync manually
-        'use_log': False,
-        'binary': False,
+        # Keys and values are encoded once up front
+        'binary': True,
+        **FAST_KW,
     }
 
-    count = 2048
+    prefixes = (b"k", b"z", b"a", b"f", b"1")
+
+    values = _ITOA[:count]
+    records = {
+        prefix: [(prefix + value, value) for value in values]
+        for prefix in prefixes
+    }
+
+    def fill(db, prefix):
+        with db.transaction():
+            for key, value in records[prefix]:
+                db[key] = value
+
+        db.flush()
+
+    for prefix in prefixes[:-1]:
+        with LSM(path, **kwargs) as db:
+            fill(db, prefix)
+
+    # The last writer reads back everything written by the previous ones
+    with LSM(path, **kwargs) as db:
+        fill(db, prefixes[-1])
+        db.checkpoint()
+
+        for prefix in prefixes:
+            expected = set(records[prefix])
+
+            with db.cursor() as cursor:
+                # Keys are sorted, so the records of the prefix are adjacent
+                cursor.seek(prefix, SEEK_GE)
+                batch = cursor.fetch_many()
+
+                while batch:
+                    matched = [
+                        record for record in batch
+                        if record[0].startswith(prefix)
+                    ]
+
+                    for record in matched:
+                        # KeyError means the record is unexpected or duplicated
+                        expected.remove(record)
+
+                    # The first foreign key ends the range of the prefix
+                    if len(matched) < len(batch):
+                        break
 
-    for prefix in ("k", "z", "a", "f", "1"):
-        with LSM(str(tmp_path / "test.lsm"), **kwargs) as db:
-            for i in range(count):
-                db['{}{}'.format(prefix, i)] = str(i)
+                    batch = cursor.fetch_many()
 
-    with LSM(str(tmp_path / "test.lsm"), binary=False, readonly=True) as db:
-        for prefix in ("k", "z", "a", "f", "1"):
-            with subtests.test(msg="prefix {}".format(i)):
-                for i in range(count):
-                    assert db['{}{}'.format(prefix, i)] == str(i)
+            assert not expected, prefix
 
-                for key, value in db.items():
-                    assert key[1:] == value, (key, value)
 
+@pytest.fixture(scope="session")
+def db(request, fast_tmp_path_factory):
+    # Parametrized indirectly, so there is one handle per mode per session
+    binary = request.param
+    path = fast_tmp_path_factory("simple") / (
+        "binary.lsm" if binary else "strings.lsm"
+    )
+    with LSM(path, binary=binary, **FAST_KW) as db:
+        yield db
 
-def test_db_binary(subtests, tmp_path):
-    with LSM(str(tmp_path / "test.lsm"), binary=True) as db:
-        with subtests.test(msg="str to binary mode"):
-            with pytest.raises(ValueError):
-                _ = db['foo']
 
-            with pytest.raises(ValueError):
-                db['foo'] = 'bar'
+@pytest.fixture
+def key_prefix(request) -> str:
+    # Keeps keys of the tests sharing one database apart
+    return request.node.name + ":"
 
-        with subtests.test(msg="test KeyError"):
-            with pytest.raises(KeyError):
-                _ = db[b'foo']
 
-            with pytest.raises(KeyError):
-                del db[b'foo']
+def swap_type(obj):
+    return obj.decode() if isinstance(obj, bytes) else obj.encode()
 
-        with subtests.test(msg="test mapping-like set"):
-            assert b'foo' not in db
-            db[b'foo'] = b'bar'
-            assert b'foo' in db
 
-        with subtests.test(msg="test mapping-like get"):
-            assert db[b'foo'] == b'bar'
+@pytest.mark.parametrize(
+    "db,key,value", [
+        (True, b'foo', b'bar'),
+        (False, 'foo', 'bar'),
+    ], ids=["binary", "strings"], indirect=["db"],
+)
+def test_db_mapping(subtests, db, key_prefix, key, value):
+    binary = isinstance(key, bytes)
 
-        with subtests.test(msg="test KeyError"):
-            del db[b'foo']
-            with pytest.raises(KeyError):
-                _ = db[b'foo']
+    wrong_key, wrong_value = swap_type(key), swap_type(value)
+    key = (key_prefix.encode() if binary else key_prefix) + key
 
+    with subtests.test(msg="wrong type for the mode"):
+        with pytest.raises(ValueError):
+            _ = db[wrong_key]
 
-def test_db_strings(subtests, tmp_path):
-    with LSM(str(tmp_path / "test.lsm"), binary=False) as db:
-        with subtests.test(msg="bytes to string mode"):
-            with pytest.raises(ValueError):
-                _ = db[b'foo']
+        with pytest.raises(ValueError):
+            db[wrong_key] = wrong_value
 
-            with pytest.raises(ValueError):
-                db[b'foo'] = b'bar'
+    with subtests.test(msg="test KeyError"):
+        with pytest.raises(KeyError):
+            _ = db[key]
 
-        with subtests.test(msg="test KeyError"):
-            with pytest.raises(KeyError):
-                _ = db['foo']
+        with pytest.raises(KeyError):
+            del db[key]
 
-            with pytest.raises(KeyError):
-                del db['foo']
+        with pytest.raises(KeyError):
+            db.pop(key)
 
-        with subtests.test(msg="test mapping-like set"):
-            assert 'foo' not in db
-            db['foo'] = 'bar'
-            assert 'foo' in db
+        assert db.pop(key, None) is None
 
-        with subtests.test(msg="test mapping-like get"):
-            assert db['foo'] == 'bar'
+    assert key not in db
+    db[key] = value
+    assert key in db
+    assert db[key] == value
 
-        with subtests.test(msg="test KeyError"):
-            del db['foo']
-            with pytest.raises(KeyError):
-                _ = db['foo']
+    assert db.pop(key) == value
+    with pytest.raises(KeyError):
+        _ = db[key]